@@ -0,0 +1,137 @@
+"""
+Cache Helper Functions
+
+Redis-backed response cache and in-flight request coalescing for read-heavy endpoints.
+Caching is skipped entirely when REDIS_URL is not configured.
+"""
+
+import asyncio
+from functools import wraps
+import hashlib
+import inspect
+import os
+from dotenv import load_dotenv
+import orjson
+from fastapi import Request, Response
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+# Load environment variables from .env file
+load_dotenv()
+
+redis = None
+
+# In-flight loads by key, shared by concurrent identical requests
+_inflight = {}
+
+# Invalidation count per prefix in this process; Redis holds the shared count
+_generations = {}
+
+redis_url = os.getenv("REDIS_URL")
+
+if redis_url:
+    redis = Redis.from_url(redis_url)
+
+def dumps(data) -> bytes:
+    """Serialize data to JSON bytes (ObjectId and other unknown types become strings)"""
+    return orjson.dumps(data, default=str, option=orjson.OPT_NAIVE_UTC)
+
+def _make_key(prefix: str, params: dict) -> str:
+    # Hash a JSON encoding so None vs "None" and values containing ":"/"=" can't collide
+    digest = hashlib.blake2b(orjson.dumps(sorted(params.items())), digest_size=16).hexdigest()
+    return prefix + ":" + digest
+
+async def _get(key: str):
+    if redis is None:
+        return None
+    try:
+        return await redis.get(key)
+    except RedisError:
+        return None
+
+async def _set(key: str, body: bytes, ttl: int):
+    if redis is None:
+        return
+    try:
+        await redis.set(key, body, ex=ttl)
+    except RedisError:
+        pass
+
+async def coalesce(key, factory):
+    """Await factory() once per key; concurrent callers with the same key share the result"""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shield so one caller disconnecting doesn't cancel the load for the others
+    return await asyncio.shield(task)
+
+def cache_headers(body: bytes, max_age: int = 60) -> dict:
+    """ETag and Cache-Control headers for body; precompute these for constant bodies"""
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    return {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+
+def conditional_response(request: Request, body: bytes, max_age: int = 60, headers: dict = None) -> Response:
+    """JSON response with ETag/Cache-Control, or 304 if the client already has this body"""
+    if headers is None:
+        headers = cache_headers(body, max_age)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if headers["ETag"] in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _generation_key(prefix: str) -> str:
+    # Kept outside the "<prefix>:*" pattern so invalidate() doesn't delete it
+    return f"cache-generation:{prefix}"
+
+async def generation(prefix: str):
+    """Current invalidation generation of prefix; changes whenever invalidate(prefix) runs"""
+    shared = None
+    if redis is not None:
+        try:
+            shared = await redis.get(_generation_key(prefix))
+        except RedisError:
+            pass
+    return (_generations.get(prefix, 0), shared)
+
+async def _load(prefix: str, key: str, loaded_generation, func, kwargs: dict, ttl: int) -> bytes:
+    body = dumps(await func(**kwargs))
+    # Don't cache a body read before a write that invalidated this prefix
+    if await generation(prefix) == loaded_generation:
+        await _set(key, body, ttl)
+    return body
+
+def cached(prefix: str, ttl: int = 60):
+    """Cache an endpoint's JSON response in Redis, keyed by prefix and query params"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(request: Request, **kwargs):
+            key = _make_key(prefix, kwargs)
+            body = await _get(key)
+            if body is None:
+                current = await generation(prefix)
+                body = await coalesce((key, current), lambda: _load(prefix, key, current, func, kwargs, ttl))
+            return conditional_response(request, body, max_age=ttl)
+        # Expose the request to FastAPI's dependency injection without the endpoint declaring it
+        sig = inspect.signature(func)
+        request_param = inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        wrapper.__signature__ = sig.replace(parameters=[*sig.parameters.values(), request_param])
+        return wrapper
+    return decorator
+
+async def invalidate(prefix: str):
+    """Drop every cached response stored under prefix"""
+    # Bump the generation first so loads already in flight skip caching their result
+    _generations[prefix] = _generations.get(prefix, 0) + 1
+    if redis is None:
+        return
+    try:
+        await redis.incr(_generation_key(prefix))
+        keys = [key async for key in redis.scan_iter(match=f"{prefix}:*")]
+        if keys:
+            await redis.delete(*keys)
+    except RedisError:
+        pass
@@ -1,15 +1,16 @@
 """
 Database Helper Functions
 
-MongoDB helper functions ready to use in your backend code.
-Import and use these functions in your API endpoints for database operations.
+Async MongoDB (Motor) helper functions ready to use in your backend code.
+Import and await these functions in your async API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 from datetime import datetime, timezone
 import os
+import time
 from dotenv import load_dotenv
-from typing import Union
+from typing import List, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -17,39 +18,100 @@ load_dotenv()
 
 _client = None
 db = None
+fs = None
+
+COLLECTIONS_CACHE_TTL = 10  # seconds
+_collections_cache = (0.0, None)
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    # Shared client; size the pool so concurrent requests don't queue on checkout
+    _client = AsyncIOMotorClient(
+        database_url,
+        maxPoolSize=int(os.getenv("DATABASE_MAX_POOL_SIZE", 100)),
+        minPoolSize=int(os.getenv("DATABASE_MIN_POOL_SIZE", 10)),
+        waitQueueTimeoutMS=5000,
+        serverSelectionTimeoutMS=3000,
+        retryWrites=True,
+    )
     db = _client[database_name]
+    fs = AsyncIOMotorGridFSBucket(db)
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-
-    # Convert Pydantic model to dict if needed
+def to_document(data: Union[BaseModel, dict]) -> dict:
+    """Prepare data for insertion: dump Pydantic models and stamp created_at/updated_at"""
+    # Convert Pydantic model to dict if needed; unset optionals are not stored
     if isinstance(data, BaseModel):
-        data_dict = data.model_dump()
+        data_dict = data.model_dump(exclude_none=True)
     else:
         data_dict = data.copy()
 
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
+    return data_dict
 
-    result = db[collection_name].insert_one(data_dict)
+# Helper functions for common database operations
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = await db[collection_name].insert_one(to_document(data))
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def insert_documents(collection_name: str, documents: List[dict]):
+    """Insert documents already prepared with to_document, as-is, in a single round-trip"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = await db[collection_name].insert_many(documents, ordered=False)
+    return [str(i) for i in result.inserted_ids]
+
+async def get_collection_names():
+    """List collection names, cached for a few seconds to avoid an admin round-trip per call"""
+    global _collections_cache
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    ts, names = _collections_cache
+    if names is None or time.monotonic() - ts > COLLECTIONS_CACHE_TTL:
+        names = await db.list_collection_names()
+        _collections_cache = (time.monotonic(), names)
+    return names
+
+def open_upload_stream(filename: str, metadata: dict = None):
+    """Open a GridFS stream for writing a file in chunks"""
+    if fs is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return fs.open_upload_stream(filename, metadata=metadata)
+
+async def delete_file(file_id):
+    """Delete a GridFS file and its chunks"""
+    if fs is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    await fs.delete(file_id)
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection, with the ObjectId `_id` returned as a string `id`"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    cursor = db[collection_name].find(filter_dict or {})
+    pipeline = [{"$match": filter_dict or {}}]
     if limit:
-        cursor = cursor.limit(limit)
+        pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": projection})
+    pipeline.append({"$addFields": {"id": {"$toString": "$_id"}}})
+    pipeline.append({"$project": {"_id": 0}})
     
-    return list(cursor)
+    return await db[collection_name].aggregate(pipeline).to_list(length=None)
+
+async def aggregate_documents(collection_name: str, pipeline: list):
+    """Run an aggregation pipeline on a collection"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return await db[collection_name].aggregate(pipeline).to_list(length=None)
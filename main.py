@@ -1,37 +1,68 @@
 import os
+import asyncio
+import hashlib
+import logging
+import time
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from urllib.parse import quote_plus
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-import base64
 
-from database import db, create_document, get_documents
+from cache import cache_headers, cached, coalesce, conditional_response, generation, invalidate, dumps
+from database import (
+    db, create_document, insert_documents, to_document, get_documents,
+    get_collection_names, aggregate_documents, open_upload_stream, delete_file
+)
 from schemas import (
     Patient, Hospital, Doctor, Treatment, Appointment, TravelRequest,
     Document, ChatMessage, Review, AnalyticsEvent, Staff
 )
 
+logger = logging.getLogger(__name__)
+
 APP_NAME = "MediBridge Bangalore API"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+DIRECTORY_CACHE_TTL = 60  # seconds
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Constant payloads, serialized once at import
+_ROOT_BYTES = dumps({"app": APP_NAME, "status": "ok"})
+_LANGUAGES_BYTES = dumps({"supported": ["en", "ar", "fr", "ru", "es", "bn", "ne", "ml", "kn"], "default": "en"})
+_LANGUAGES_HEADERS = cache_headers(_LANGUAGES_BYTES, max_age=DIRECTORY_CACHE_TTL)
+
+class MongoJSONResponse(ORJSONResponse):
+    """orjson response that also handles ObjectId and naive datetimes"""
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
 
-app = FastAPI(title=APP_NAME)
+app = FastAPI(title=APP_NAME, default_response_class=MongoJSONResponse)
+
+# Comma-separated list of allowed origins; "*" keeps the API fully public
+ALLOWED_ORIGINS = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "*").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=ALLOWED_ORIGINS,
+    # Browsers reject credentialed responses with a wildcard origin
+    allow_credentials="*" not in ALLOWED_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 # ------------------------ Base Routes ------------------------
 @app.get("/")
-def root():
-    return {"app": APP_NAME, "status": "ok"}
+async def root():
+    return Response(content=_ROOT_BYTES, media_type="application/json")
 
 @app.get("/test")
-def test_database():
+async def test_database():
     info = {
         "backend": "running",
         "database": "not connected" if db is None else "connected",
@@ -39,115 +70,161 @@ def test_database():
     }
     try:
         if db is not None:
-            info["collections"] = db.list_collection_names()
+            info["collections"] = await get_collection_names()
     except Exception as e:
         info["error"] = str(e)
     return info
 
 # ------------------------ Seed sample data on first run ------------------------
+def _seed_id(collection_name: str, name: str) -> ObjectId:
+    # Deterministic per record, so workers seeding concurrently collide on _id
+    return ObjectId(hashlib.blake2b(f"{collection_name}:{name}".encode(), digest_size=12).digest())
+
+async def _seed(collection_name: str, items: List[BaseModel]):
+    documents = [dict(to_document(item), _id=_seed_id(collection_name, item.name)) for item in items]
+    try:
+        await insert_documents(collection_name, documents)
+    except BulkWriteError as e:
+        # Another worker already inserted these records
+        if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+            raise
+
 @app.on_event("startup")
 async def seed_sample():
     if db is None:
         return
+    # Indexes for the list endpoint filters
+    await db.hospital.create_index([("specialties", 1)])
+    await db.hospital.create_index([("name", "text")])
+    await db.doctor.create_index([("hospital_id", 1), ("specialty", 1)])
+    await db.treatment.create_index([("category", 1)])
+    await db.review.create_index([("hospital_id", 1)])
+    await db.review.create_index([("doctor_id", 1)])
     # Seed hospitals
-    if "hospital" not in db.list_collection_names() or db.hospital.count_documents({}) == 0:
-        create_document("hospital", Hospital(
-            name="Narayana Health City",
-            type="multi-specialty",
-            address="Bommasandra, Bengaluru",
-            city="Bengaluru",
-            state="Karnataka",
-            country="India",
-            accreditation="NABH/JCI",
-            specialties=["cardiac", "orthopedic", "oncology", "neuro"],
-            rating=4.6,
-            emergency_helpline="1800-123-4567",
-            website="https://www.narayanahealth.org/",
-            images=[]
-        ))
-        create_document("hospital", Hospital(
-            name="Manipal Hospital Old Airport Road",
-            type="multi-specialty",
-            address="HAL Old Airport Rd, Bengaluru",
-            city="Bengaluru",
-            state="Karnataka",
-            country="India",
-            accreditation="NABH",
-            specialties=["cardiac", "fertility", "orthopedic", "dental"],
-            rating=4.5,
-            emergency_helpline="080-2222-3333",
-            website="https://www.manipalhospitals.com/",
-            images=[]
-        ))
+    if await db.hospital.estimated_document_count() == 0:
+        await _seed("hospital", [
+            Hospital(
+                name="Narayana Health City",
+                type="multi-specialty",
+                address="Bommasandra, Bengaluru",
+                city="Bengaluru",
+                state="Karnataka",
+                country="India",
+                accreditation="NABH/JCI",
+                specialties=["cardiac", "orthopedic", "oncology", "neuro"],
+                rating=4.6,
+                emergency_helpline="1800-123-4567",
+                website="https://www.narayanahealth.org/",
+                images=[]
+            ),
+            Hospital(
+                name="Manipal Hospital Old Airport Road",
+                type="multi-specialty",
+                address="HAL Old Airport Rd, Bengaluru",
+                city="Bengaluru",
+                state="Karnataka",
+                country="India",
+                accreditation="NABH",
+                specialties=["cardiac", "fertility", "orthopedic", "dental"],
+                rating=4.5,
+                emergency_helpline="080-2222-3333",
+                website="https://www.manipalhospitals.com/",
+                images=[]
+            ),
+        ])
+        await invalidate("hospitals")
     # Seed treatments
-    if "treatment" not in db.list_collection_names() or db.treatment.count_documents({}) == 0:
-        create_document("treatment", Treatment(
-            name="CABG - Coronary Bypass", category="cardiac",
-            average_cost_inr_min=250000, average_cost_inr_max=450000, typical_stay_days=7, success_rate=95.0
-        ))
-        create_document("treatment", Treatment(
-            name="Total Knee Replacement", category="orthopedic",
-            average_cost_inr_min=180000, average_cost_inr_max=350000, typical_stay_days=5
-        ))
-        create_document("treatment", Treatment(
-            name="Dental Implants", category="dental",
-            average_cost_inr_min=25000, average_cost_inr_max=60000, typical_stay_days=1
-        ))
+    if await db.treatment.estimated_document_count() == 0:
+        await _seed("treatment", [
+            Treatment(
+                name="CABG - Coronary Bypass", category="cardiac",
+                average_cost_inr_min=250000, average_cost_inr_max=450000, typical_stay_days=7, success_rate=95.0
+            ),
+            Treatment(
+                name="Total Knee Replacement", category="orthopedic",
+                average_cost_inr_min=180000, average_cost_inr_max=350000, typical_stay_days=5
+            ),
+            Treatment(
+                name="Dental Implants", category="dental",
+                average_cost_inr_min=25000, average_cost_inr_max=60000, typical_stay_days=1
+            ),
+        ])
+        await invalidate("treatments")
+    await load_specialty_index()
 
 # ------------------------ Directory Data ------------------------
 @app.get("/hospitals")
-def list_hospitals(q: Optional[str] = None, specialty: Optional[str] = None):
+@cached("hospitals", ttl=DIRECTORY_CACHE_TTL)
+async def list_hospitals(q: Optional[str] = None, specialty: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
     filt: Dict[str, Any] = {}
     if q:
-        filt["name"] = {"$regex": q, "$options": "i"}
+        filt["$text"] = {"$search": q}
     if specialty:
         filt["specialties"] = {"$in": [specialty]}
-    hospitals = get_documents("hospital", filt)
-    for h in hospitals:
-        if "_id" in h:
-            h["id"] = str(h.pop("_id"))
-    return hospitals
+    return await get_documents("hospital", filt, limit=limit)
 
 @app.post("/hospitals")
-def create_hospital(payload: Hospital):
-    hid = create_document("hospital", payload)
+async def create_hospital(payload: Hospital):
+    hid = await create_document("hospital", payload)
+    await invalidate("hospitals")
     return {"id": hid}
 
 @app.get("/doctors")
-def list_doctors(hospital_id: Optional[str] = None, specialty: Optional[str] = None):
+@cached("doctors", ttl=DIRECTORY_CACHE_TTL)
+async def list_doctors(hospital_id: Optional[str] = None, specialty: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
     filt: Dict[str, Any] = {}
     if hospital_id:
         filt["hospital_id"] = hospital_id
     if specialty:
         filt["specialty"] = specialty
-    docs = get_documents("doctor", filt)
-    for d in docs:
-        if "_id" in d:
-            d["id"] = str(d.pop("_id"))
-    return docs
+    return await get_documents("doctor", filt, limit=limit)
 
 @app.post("/doctors")
-def create_doctor(payload: Doctor):
-    did = create_document("doctor", payload)
+async def create_doctor(payload: Doctor):
+    did = await create_document("doctor", payload)
+    await invalidate("doctors")
     return {"id": did}
 
 @app.get("/treatments")
-def list_treatments(category: Optional[str] = None):
+@cached("treatments", ttl=DIRECTORY_CACHE_TTL)
+async def list_treatments(category: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
     filt: Dict[str, Any] = {}
     if category:
         filt["category"] = category
-    ts = get_documents("treatment", filt)
-    for t in ts:
-        if "_id" in t:
-            t["id"] = str(t.pop("_id"))
-    return ts
+    return await get_documents("treatment", filt, limit=limit)
 
 @app.post("/treatments")
-def create_treatment(payload: Treatment):
-    tid = create_document("treatment", payload)
+async def create_treatment(payload: Treatment):
+    tid = await create_document("treatment", payload)
+    await invalidate("treatments")
     return {"id": tid}
 
 # ------------------------ AI-like Recommendation & Cost Estimator ------------------------
+# specialty -> hospital names; reloaded after DIRECTORY_CACHE_TTL or when any
+# worker invalidates "hospitals" (shared through Redis when configured)
+SPECIALTY_INDEX: Dict[str, List[str]] = {}
+_specialty_index_version = (float("-inf"), None)  # (loaded_at, hospitals generation)
+
+async def load_specialty_index():
+    global _specialty_index_version
+    # Read the generation first so a write during the query triggers another reload
+    hospitals_generation = await generation("hospitals")
+    pipeline = [
+        {"$unwind": "$specialties"},
+        {"$group": {"_id": "$specialties", "names": {"$push": "$name"}}},
+    ]
+    groups = await aggregate_documents("hospital", pipeline)
+    SPECIALTY_INDEX.clear()
+    SPECIALTY_INDEX.update({g["_id"]: g["names"] for g in groups})
+    _specialty_index_version = (time.monotonic(), hospitals_generation)
+
+async def specialty_hospitals(specialty: str) -> List[str]:
+    loaded_at, hospitals_generation = _specialty_index_version
+    if (time.monotonic() - loaded_at > DIRECTORY_CACHE_TTL
+            or await generation("hospitals") != hospitals_generation):
+        await coalesce("specialty-index", load_specialty_index)
+    return SPECIALTY_INDEX.get(specialty, [])
+
 class RecommendRequest(BaseModel):
     treatment_category: str
     preference: Optional[str] = None  # cost | success | speed
@@ -159,97 +236,187 @@ class RecommendResponse(BaseModel):
     suggested_hospitals: List[str]
 
 @app.post("/recommend", response_model=RecommendResponse)
-def recommend(req: RecommendRequest):
-    treatments = get_documents("treatment", {"category": req.treatment_category})
-    if not treatments:
+async def recommend(req: RecommendRequest):
+    category = req.treatment_category
+    # One round-trip for treatment names and cost range; hospitals come from memory
+    pipeline = [
+        {"$match": {"category": category}},
+        {"$facet": {
+            "treatments": [{"$limit": 5}, {"$project": {"_id": 0, "name": 1}}],
+            "cost": [{"$group": {
+                "_id": None,
+                "min": {"$min": "$average_cost_inr_min"},
+                "max": {"$max": "$average_cost_inr_max"},
+            }}],
+        }},
+    ]
+    # Identical in-flight categories share one aggregation
+    result = (await coalesce(("recommend", category), lambda: aggregate_documents("treatment", pipeline)))[0]
+    if not result["treatments"]:
         raise HTTPException(404, "No treatments found for category")
-    est_min = min(t.get("average_cost_inr_min", 0) for t in treatments)
-    est_max = max(t.get("average_cost_inr_max", 0) for t in treatments)
+    cost = result["cost"][0]
+    est_min = cost.get("min") or 0
+    est_max = cost.get("max") or 0
     adj = 1.0
     if req.preference == "cost":
         adj = 0.9
     elif req.preference == "success":
         adj = 1.1
     adj += 0.05 * len(req.comorbidities)
-    hospitals = get_documents("hospital", {"specialties": {"$in": [req.treatment_category]}})
     return RecommendResponse(
-        recommended_treatments=[t["name"] for t in treatments][:5],
+        recommended_treatments=[t["name"] for t in result["treatments"]],
         estimated_cost_inr={"min": round(est_min * adj, 2), "max": round(est_max * adj, 2)},
-        suggested_hospitals=[h["name"] for h in hospitals][:5]
+        suggested_hospitals=(await specialty_hospitals(category))[:5]
     )
 
 # ------------------------ Appointments & Teleconsultations ------------------------
 @app.post("/appointments")
-def create_appointment(payload: Appointment):
-    aid = create_document("appointment", payload)
+async def create_appointment(payload: Appointment):
+    aid = await create_document("appointment", payload)
     return {"id": aid}
 
 # ------------------------ Travel & Concierge ------------------------
 @app.post("/travel-requests")
-def create_travel_request(payload: TravelRequest):
-    tid = create_document("travelrequest", payload)
+async def create_travel_request(payload: TravelRequest):
+    tid = await create_document("travelrequest", payload)
     return {"id": tid}
 
 # ------------------------ Chat with Coordinators ------------------------
 @app.post("/chat/send")
-def send_message(payload: ChatMessage):
-    mid = create_document("chatmessage", payload)
+async def send_message(payload: ChatMessage):
+    mid = await create_document("chatmessage", payload)
     return {"id": mid}
 
-# ------------------------ Document Upload (Base64-encoded storage) ------------------------
+# ------------------------ Document Upload (GridFS storage) ------------------------
 @app.post("/documents/upload")
 async def upload_document(patient_id: str, file: UploadFile = File(...)):
-    content = await file.read()
-    encrypted_b64 = base64.b64encode(content).decode("utf-8")
+    content_type = file.content_type or "application/octet-stream"
+    grid_in = open_upload_stream(file.filename, metadata={"patient_id": patient_id, "content_type": content_type})
+    size_bytes = 0
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await grid_in.write(chunk)
+            size_bytes += len(chunk)
+        await grid_in.close()
+    except BaseException:
+        # Includes cancellation; drop every chunk written so far
+        await grid_in.abort()
+        raise
     doc = Document(
         patient_id=patient_id,
         filename=file.filename,
-        content_type=file.content_type or "application/octet-stream",
-        encrypted_b64=encrypted_b64,
-        size_bytes=len(content),
+        content_type=content_type,
+        file_id=str(grid_in._id),
+        size_bytes=size_bytes,
     )
-    did = create_document("document", doc)
+    try:
+        did = await create_document("document", doc)
+    except Exception:
+        # Don't leave a GridFS file that no document record points to
+        await delete_file(grid_in._id)
+        raise
     return {"id": did}
 
 # ------------------------ Reviews & Stories ------------------------
 @app.post("/reviews")
-def create_review(payload: Review):
-    rid = create_document("review", payload)
+async def create_review(payload: Review):
+    rid = await create_document("review", payload)
     return {"id": rid}
 
 @app.get("/reviews")
-def list_reviews(hospital_id: Optional[str] = None, doctor_id: Optional[str] = None):
+async def list_reviews(hospital_id: Optional[str] = None, doctor_id: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
     filt: Dict[str, Any] = {}
     if hospital_id:
         filt["hospital_id"] = hospital_id
     if doctor_id:
         filt["doctor_id"] = doctor_id
-    revs = get_documents("review", filt)
-    for r in revs:
-        if "_id" in r:
-            r["id"] = str(r.pop("_id"))
-    return revs
+    return await get_documents("review", filt, limit=limit)
 
 # ------------------------ Analytics ------------------------
+# Events are buffered and written in batches by a background task,
+# so the request doesn't wait on a Mongo round-trip.
+ANALYTICS_QUEUE_SIZE = 10000
+ANALYTICS_BATCH_SIZE = 500
+ANALYTICS_FLUSH_INTERVAL = 1.0  # seconds
+
+_analytics_queue: Optional[asyncio.Queue] = None
+_analytics_task: Optional[asyncio.Task] = None
+_ANALYTICS_STOP = object()
+
+async def _write_analytics(batch: List[dict]):
+    try:
+        await insert_documents("analyticsevent", batch)
+    except Exception:
+        logger.exception("Failed to write %d analytics events", len(batch))
+
+async def _drain_analytics():
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        batch = []
+        event = await _analytics_queue.get()
+        deadline = loop.time() + ANALYTICS_FLUSH_INTERVAL
+        while True:
+            if event is _ANALYTICS_STOP:
+                stopping = True
+                break
+            batch.append(event)
+            timeout = deadline - loop.time()
+            if len(batch) >= ANALYTICS_BATCH_SIZE or timeout <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(_analytics_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+        if batch:
+            await _write_analytics(batch)
+
+@app.on_event("startup")
+async def start_analytics_writer():
+    global _analytics_queue, _analytics_task
+    if db is None:
+        return
+    _analytics_queue = asyncio.Queue(maxsize=ANALYTICS_QUEUE_SIZE)
+    _analytics_task = asyncio.create_task(_drain_analytics())
+
+@app.on_event("shutdown")
+async def stop_analytics_writer():
+    if _analytics_task is None:
+        return
+    # Let the writer flush everything queued before the stop marker
+    await _analytics_queue.put(_ANALYTICS_STOP)
+    await _analytics_task
+
 @app.post("/analytics")
-def track_event(payload: AnalyticsEvent):
-    eid = create_document("analyticsevent", payload)
-    return {"id": eid}
+async def track_event(payload: AnalyticsEvent):
+    if _analytics_queue is None:
+        eid = await create_document("analyticsevent", payload)
+        return {"id": eid}
+    # Timestamp now and assign the id client-side so it can be returned before the write
+    event = to_document(payload)
+    event["_id"] = ObjectId()
+    try:
+        _analytics_queue.put_nowait(event)
+    except asyncio.QueueFull:
+        await insert_documents("analyticsevent", [event])
+    return {"id": str(event["_id"])}
 
 # ------------------------ Utilities ------------------------
 @app.get("/languages")
-def languages():
-    return {"supported": ["en", "ar", "fr", "ru", "es", "bn", "ne", "ml", "kn"], "default": "en"}
+async def languages(request: Request):
+    return conditional_response(request, _LANGUAGES_BYTES, headers=_LANGUAGES_HEADERS)
 
 @app.get("/contact/whatsapp")
 def whatsapp_link(phone_e164: str, text: Optional[str] = None):
     base = "https://wa.me/" + phone_e164.replace("+", "")
     if text:
-        from urllib.parse import urlencode
-        return {"url": base + "?" + urlencode({"text": text})}
+        return {"url": f"{base}?text={quote_plus(text)}"}
     return {"url": base}
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Each worker has its own Mongo pool and in-process caches; scale out via WEB_CONCURRENCY
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    # "auto" picks uvloop and httptools when installed (uvicorn[standard])
+    uvicorn.run("main:app", host="0.0.0.0", port=port, loop="auto", http="auto", workers=workers)
@@ -6,15 +6,18 @@ lowercase of the class name.
 
 Use these schemas with the provided database helpers:
 - create_document(collection_name, data)
-- get_documents(collection_name, filter_dict, limit)
+- insert_documents(collection_name, documents)
+- get_documents(collection_name, filter_dict, limit, projection)
 """
 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, ConfigDict, Field, EmailStr
 from typing import Optional, List, Literal, Dict
 from datetime import datetime
 
 # ----------------------------- Core Users -----------------------------
 class Patient(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     name: str
     email: EmailStr
     phone: Optional[str] = None
@@ -26,6 +29,8 @@ class Patient(BaseModel):
     is_verified: bool = True
 
 class Hospital(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     name: str
     type: Literal["multi-specialty", "specialty", "clinic"] = "multi-specialty"
     address: str
@@ -43,6 +48,8 @@ class Hospital(BaseModel):
     images: List[str] = []
 
 class Doctor(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     name: str
     hospital_id: str
     specialty: str
@@ -54,6 +61,8 @@ class Doctor(BaseModel):
     consultation_fee: float = 1000.0
 
 class Treatment(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     name: str
     category: Literal[
         "cardiac", "orthopedic", "dental", "cosmetic", "fertility", "oncology", "neuro", "general"
@@ -67,6 +76,8 @@ class Treatment(BaseModel):
 
 # ----------------------------- Operational -----------------------------
 class Appointment(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     patient_id: str
     doctor_id: str
     hospital_id: str
@@ -76,6 +87,8 @@ class Appointment(BaseModel):
     notes: Optional[str] = None
 
 class TravelRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     patient_id: str
     services: List[str] = ["visa_guidance", "airport_pickup", "accommodation"]
     travel_dates: Dict[str, Optional[str]] = {"arrival": None, "departure": None}
@@ -84,13 +97,18 @@ class TravelRequest(BaseModel):
     notes: Optional[str] = None
 
 class Document(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     patient_id: str
     filename: str
     content_type: str
-    encrypted_b64: str
+    file_id: str  # GridFS file holding the content
+    encrypted_b64: Optional[str] = None  # deprecated: legacy inline base64 content
     size_bytes: int
 
 class ChatMessage(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     room_id: str
     sender_id: str
     sender_role: Literal["patient", "hospital", "facilitator", "admin"] = "patient"
@@ -98,6 +116,8 @@ class ChatMessage(BaseModel):
     type: Literal["text", "file"] = "text"
 
 class Review(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     patient_id: str
     hospital_id: Optional[str] = None
     doctor_id: Optional[str] = None
@@ -106,6 +126,8 @@ class Review(BaseModel):
     comment: Optional[str] = None
 
 class AnalyticsEvent(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     user_id: Optional[str] = None
     event: str
     properties: Dict[str, str] = {}
@@ -113,6 +135,8 @@ class AnalyticsEvent(BaseModel):
 
 # Dashboard role user for hospitals/facilitators
 class Staff(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     name: str
     email: EmailStr
     role: Literal["hospital_admin", "coordinator", "facilitator", "analyst"] = "coordinator"
@@ -0,0 +1,167 @@
+import asyncio
+
+from starlette.requests import Request
+
+import cache
+
+
+def _request(if_none_match: str = None) -> Request:
+    headers = []
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_make_key_distinguishes_none_from_string():
+    assert cache._make_key("hospitals", {"q": None}) != cache._make_key("hospitals", {"q": "None"})
+
+
+def test_make_key_resists_separator_injection():
+    a = cache._make_key("hospitals", {"q": "x:specialty=cardiac", "specialty": None})
+    b = cache._make_key("hospitals", {"q": "x", "specialty": "cardiac:specialty=None"})
+    assert a != b
+
+
+def test_make_key_is_order_independent_and_prefixed():
+    a = cache._make_key("hospitals", {"q": "x", "limit": 50})
+    b = cache._make_key("hospitals", {"limit": 50, "q": "x"})
+    assert a == b
+    assert a.startswith("hospitals:")
+
+
+def test_conditional_response_sets_cache_headers():
+    response = cache.conditional_response(_request(), b"[]", max_age=60)
+    assert response.status_code == 200
+    assert response.body == b"[]"
+    assert response.headers["cache-control"] == "public, max-age=60"
+    assert response.headers["etag"].startswith('"')
+
+
+def test_conditional_response_not_modified():
+    etag = cache.conditional_response(_request(), b"[]").headers["etag"]
+    for header in (etag, "W/" + etag, '"other", ' + etag, "*"):
+        response = cache.conditional_response(_request(header), b"[]")
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == etag
+
+
+def test_conditional_response_uses_precomputed_headers():
+    headers = cache.cache_headers(b"[]", max_age=300)
+    response = cache.conditional_response(_request(), b"[]", headers=headers)
+    assert response.headers["etag"] == headers["ETag"]
+    assert response.headers["cache-control"] == "public, max-age=300"
+    assert cache.conditional_response(_request(headers["ETag"]), b"[]", headers=headers).status_code == 304
+
+
+def test_conditional_response_etag_mismatch():
+    response = cache.conditional_response(_request('"stale"'), b"[]")
+    assert response.status_code == 200
+
+
+def test_coalesce_shares_one_load():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def run():
+        return await asyncio.gather(*[cache.coalesce("k", load) for _ in range(10)])
+
+    assert asyncio.run(run()) == [1] * 10
+    assert calls == [1]
+    assert cache._inflight == {}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    async def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        for key in list(self.data):
+            if key.startswith(prefix):
+                yield key
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+def test_cached_skips_store_when_invalidated_during_load(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(cache, "redis", fake)
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    @cache.cached("items")
+    async def list_items(q=None):
+        started.set()
+        await release.wait()
+        return ["stale"]
+
+    async def run():
+        pending = asyncio.ensure_future(list_items(q=None, request=_request()))
+        await started.wait()
+        await cache.invalidate("items")
+        release.set()
+        return await pending
+
+    response = asyncio.run(run())
+    assert response.body == b'["stale"]'
+    assert not any(key.startswith("items:") for key in fake.data)
+
+
+def test_cached_stores_and_serves_body(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(cache, "redis", fake)
+    calls = []
+
+    @cache.cached("items")
+    async def list_items(q=None):
+        calls.append(q)
+        return [q]
+
+    async def run():
+        first = await list_items(q="None", request=_request())
+        second = await list_items(q="None", request=_request())
+        unfiltered = await list_items(q=None, request=_request())
+        return first, second, unfiltered
+
+    first, second, unfiltered = asyncio.run(run())
+    assert first.body == second.body == b'["None"]'
+    assert unfiltered.body == b"[null]"
+    assert calls == ["None", None]
+
+
+def test_cached_does_not_coalesce_none_with_string_none():
+    calls = []
+
+    @cache.cached("items")
+    async def list_items(q=None):
+        calls.append(q)
+        await asyncio.sleep(0.01)
+        return [q]
+
+    async def run():
+        return await asyncio.gather(
+            list_items(q=None, request=_request()),
+            list_items(q="None", request=_request()),
+        )
+
+    unfiltered, literal = asyncio.run(run())
+    assert unfiltered.body == b"[null]"
+    assert literal.body == b'["None"]'
+    assert sorted(calls, key=str) == [None, "None"]